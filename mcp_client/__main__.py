@@ -20,7 +20,13 @@ async def main() -> None:
             
             # checks whether the user provided the --chat option
             elif args.chat:
-                await client.run_chat()
+                await client.run_chat(
+                    lazy_schemas=args.lazy_schemas, quiet=args.quiet,
+                )
+
+            # checks whether the user provided the --batch option
+            elif args.batch:
+                await client.run_batch(args.batch)
 
     except RuntimeError as e: # catch connection errors
         print(e)
@@ -1,14 +1,53 @@
+import asyncio
+import threading
+
+
+async def _read_input(prompt: str) -> str:
+    """Read a line from stdin without blocking the event loop.
+
+    Uses a daemon thread rather than the default executor, so a pending
+    input() never holds up interpreter shutdown (e.g. on Ctrl-C).
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def deliver(setter, value) -> None:
+        if not future.done():
+            setter(value)
+
+    def read() -> None:
+        try:
+            callback = (future.set_result, input(prompt))
+        except Exception as e:
+            callback = (future.set_exception, e)
+        try:
+            loop.call_soon_threadsafe(deliver, *callback)
+        except RuntimeError:
+            pass # loop already closed
+
+    threading.Thread(target=read, daemon=True).start()
+    return await future
+
+
+def print_rate_limit_wait(wait: float) -> None:
+    """Tell the user why the chat is pausing near the rate limit."""
+    print(f"\n[Near OpenAI rate limit, pausing {wait:.0f}s]")
+
+
 async def run_chat(handler) -> None:
     """Run an AI-handled chat session."""
 
     print("\nMCP Client's Chat Started!")
     print("Type your queries or 'quit' to exit.")
 
+    # Fetch the tool list while the user is typing their first query
+    prewarm = asyncio.create_task(handler.prewarm_tools())
+
     # Chat loop
     while True:
         try:
-            # Get user input
-            if not (query := input("\nYou: ").strip()):
+            # Get user input without blocking the event loop
+            if not (query := (await _read_input("\nYou: ")).strip()):
                 continue
 
             # Exit condition
@@ -20,4 +59,5 @@ async def run_chat(handler) -> None:
         except Exception as e:
             print(f"\nError: {str(e)}")
 
+    prewarm.cancel()
     print("\nGoodbye!")
\ No newline at end of file
@@ -25,4 +25,33 @@ def parse_args():
         help="start an AI-powered chat with MCP server integration",
     )
 
-    return parser.parse_args()
\ No newline at end of file
+    group.add_argument(
+        # Add --batch option to run queries through the OpenAI Batch API
+        "--batch",
+        type=pathlib.Path,
+        metavar="QUERIES_FILE",
+        help="submit queries (one per line) as an OpenAI batch job",
+    )
+
+    # Add --lazy-schemas flag to send tool summaries instead of full schemas
+    parser.add_argument(
+        "--lazy-schemas",
+        action="store_true",
+        help="in chat, send tool summaries and fetch full schemas on demand",
+    )
+
+    # Add --quiet flag to leave tool call logs out of chat responses
+    parser.add_argument(
+        "--quiet",
+        action="store_true",
+        help="in chat, hide the [Used tool(...)] log lines",
+    )
+
+    args = parser.parse_args()
+    # These flags only affect chat, so don't silently ignore them elsewhere
+    if args.lazy_schemas and not args.chat:
+        parser.error("--lazy-schemas can only be used with --chat")
+    if args.quiet and not args.chat:
+        parser.error("--quiet can only be used with --chat")
+
+    return args
\ No newline at end of file
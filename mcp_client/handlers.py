@@ -1,39 +1,171 @@
+import asyncio
 import json
 import os
+import re
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable
 
+import httpx
 from mcp import ClientSession
-from openai import OpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+# Prefer orjson for tool argument (de)serialization when it's installed
+try:
+    import orjson
+
+    _loads = orjson.loads
+
+    def _dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+except ImportError:
+    _loads = json.loads
+
+    def _dumps(obj) -> str:
+        # Match orjson's compact output so logs look the same either way
+        return json.dumps(obj, separators=(",", ":"))
 
 MODEL = "gpt-4o-mini" # OpenAI model to use
 MAX_TOKENS = 1000 # Max tokens for response
+RESULT_CACHE_SIZE = 128 # Max tool results kept per handler
+RESULT_TTL_SECONDS = 300 # How long a cached tool result stays valid
+MAX_SCHEMA_ROUNDS = 3 # Extra tool rounds allowed for get_schema in lazy mode
+BATCH_POLL_SECONDS = 30 # Delay between Batch API status checks
+BATCH_COMPLETION_WINDOW = "24h" # How long OpenAI may take to run a batch
+MAX_RETRIES = 5 # SDK retries (with backoff) on 429s and transient errors
+RATE_LIMIT_FLOOR = 1 # Pause when this few requests remain in the window
+MAX_RATE_LIMIT_WAIT = 30 # Longest pause (seconds) before the next request
+
+# Durations in OpenAI rate limit reset headers, e.g. "1s", "6m0s", "20ms"
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+# Shared fallback/summary parameter schemas; treat as read-only
+_EMPTY_SCHEMA = {"type": "object", "properties": {}}
+_SUMMARY_PARAMETERS = {
+    "type": "object",
+    "properties": {},
+    "additionalProperties": True,
+}
+
+# Local tool the model calls to fetch a full schema in lazy mode
+GET_SCHEMA_TOOL = "get_schema"
+_GET_SCHEMA_SPEC = {
+    "type": "function",
+    "function": {
+        "name": GET_SCHEMA_TOOL,
+        "description": "Return the full JSON parameter schema for a tool.",
+        "parameters": {
+            "type": "object",
+            "properties": {"tool_name": {"type": "string"}},
+            "required": ["tool_name"],
+        },
+    },
+}
+
+def _parse_duration(value: str) -> float:
+    """Convert a rate limit reset header value to seconds."""
+    return sum(
+        float(amount) * _DURATION_UNITS[unit]
+        for amount, unit in _DURATION_PART.findall(value)
+    )
 
 class OpenAIQueryHandler:
     """Handle OpenAI API interaction and MCP tool execution."""
 
     # Initialize with ClientSession and OpenAI API key
-    def __init__(self, client_session: ClientSession):
+    def __init__(
+        self,
+        client_session: ClientSession,
+        cache_ttl_seconds: float = 300,
+        http_client: httpx.AsyncClient | None = None,
+        lazy_schemas: bool = False,
+        prefetched_tools: asyncio.Task | None = None,
+        final_answer_tools: Iterable[str] = (),
+        quiet: bool = False,
+        result_ttl_seconds: float = RESULT_TTL_SECONDS,
+        on_rate_limit_wait: Callable[[float], None] | None = None,
+    ):
         self.client_session = client_session
+        # Called with the pause length (seconds) before waiting out a
+        # nearly exhausted rate limit window; the handler never prints
+        self.on_rate_limit_wait = on_rate_limit_wait
+        # Leave tool call logs out of the returned response
+        self.quiet = quiet
+        # Pending list_tools() started by MCPClient, used on first fetch
+        self._prefetched_tools = prefetched_tools
+        # In lazy mode only tool summaries are sent; the model pulls
+        # full parameter schemas on demand via get_schema
+        self.lazy_schemas = lazy_schemas
+        self._full_schemas: dict[str, dict] = {}
+        # Canonical OpenAI tool schemas by tool name, alongside the source
+        # (description, inputSchema) they were built from; rebuilt on every
+        # refresh so only current tools are kept
+        self._schema_cache: dict[str, tuple] = {}
+        # LRU cache of tool results keyed by (tool_name, canonical args);
+        # only tools declared read-only (or opted in via _meta) are cached,
+        # and entries expire after result_ttl_seconds
+        self.result_ttl_seconds = result_ttl_seconds
+        self._result_cache: OrderedDict[tuple, dict] = OrderedDict()
+        self._cacheable: set[str] = set()
+        # Tools whose output is already the answer, so no summarizing
+        # model call is needed; configured here or flagged via _meta
+        self._configured_final_tools = frozenset(final_answer_tools)
+        self._final_answer_tools: set[str] = set(final_answer_tools)
+        # Formatted tool list is cached since the server's toolset
+        # rarely changes during a session
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self._tools_cache: list | None = None
+        self._tools_cache_ts: float = 0
+        # In-flight refresh shared by concurrent _get_tools callers
+        self._tools_fetch: asyncio.Task | None = None
         if not (api_key := os.getenv("OPENAI_API_KEY")):
             raise RuntimeError(
                 "Error: OPENAI_API_KEY environment variable not set",
             )
-        self.openai = OpenAI(api_key=api_key)
+        # Share one keep-alive HTTP client across all model calls. Keeps the
+        # SDK's defaults except the keep-alive pool, lowered from 100 to 10
+        # (max_connections stays at the SDK's 1000); only close it ourselves
+        # if we created it
+        self._owns_http = http_client is None
+        self._http = http_client or DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=1000,
+                max_keepalive_connections=10,
+            ),
+        )
+        self.openai = AsyncOpenAI(
+            api_key=api_key,
+            http_client=self._http,
+            max_retries=MAX_RETRIES,
+        )
+        # Cap concurrent model calls to avoid bursts of 429s
+        max_concurrency = os.getenv("OPENAI_MAX_CONCURRENCY", "5").strip()
+        if not max_concurrency.isdigit() or int(max_concurrency) < 1:
+            raise RuntimeError(
+                "Error: OPENAI_MAX_CONCURRENCY must be a positive integer, "
+                f"got '{max_concurrency}'",
+            )
+        self._sem = asyncio.Semaphore(int(max_concurrency))
+
+    async def aclose(self) -> None:
+        """Close the underlying HTTP client if owned by this handler."""
+        if self._owns_http:
+            await self._http.aclose()
     
     async def process_query(self, query: str) -> str:
         """Process a query using OpenAI and available MCP tools."""
         # Get initial model's response and decision on tool calls
         messages = [{"role": "user", "content": query}]
-        initial_response = self.openai.chat.completions.create(
-            model=MODEL,
-            max_tokens=MAX_TOKENS,
-            messages=messages,
-            tools=await self._get_tools(),
+        tools = await self._get_tools()
+        initial_response = await self._create_completion(
+            messages=messages, tools=tools,
         )
 
         # Grab the initial message and create empty list
         # for accumulating response parts
         current_message = initial_response.choices[0].message
-        result_parts = []
+        result_parts: list[str] = []
 
         # Add initial content if present
         if current_message.content:
@@ -41,65 +173,392 @@ class OpenAIQueryHandler:
 
         # Handle tool usage if present
         if tool_calls := current_message.tool_calls:
-            # Accumulate messages for tool execution
-            messages.append(
-                {
-                    "role": "assistant",
-                    "content": current_message.content or "",
-                    "tool_calls": tool_calls,
-                }
+            tool_results = await self._run_tools(
+                current_message, messages, result_parts,
             )
 
-            # Execute tools
-            for tool_call in tool_calls:
-                tool_result = await self._execute_tool(tool_call)
-                result_parts.append(tool_result["log"])
-                messages.append(tool_result["message"])
+            # In lazy mode the model may only have fetched schemas so far,
+            # so give it a few more turns with tools to make the real calls
+            rounds = 0
+            while (
+                self.lazy_schemas
+                and rounds < MAX_SCHEMA_ROUNDS
+                and self._fetched_schemas(current_message)
+            ):
+                rounds += 1
+                follow_up = await self._create_completion(
+                    messages=messages, tools=tools,
+                )
+                current_message = follow_up.choices[0].message
+                if current_message.content:
+                    result_parts.append(current_message.content)
+                if not current_message.tool_calls:
+                    # Model answered directly; nothing left to summarize
+                    return "Assistant: " + "\n".join(filter(None, result_parts))
+                tool_results = await self._run_tools(
+                    current_message, messages, result_parts,
+                )
 
-            # Get final model's response after tool execution
-            final_response = self.openai.chat.completions.create(
-                model=MODEL,
-                max_tokens=MAX_TOKENS,
-                messages=messages,
-            )
+            # Tool output already answers the query, so skip the
+            # summarizing model call and return it directly
+            if not current_message.content and all(
+                tool_result["final"] for tool_result in tool_results
+            ):
+                result_parts.extend(
+                    tool_result["message"]["content"]
+                    for tool_result in tool_results
+                )
+                return "Assistant: " + "\n".join(filter(None, result_parts))
+
+            # Get final model's response after tool execution; if the model
+            # is still fetching schemas, keep the tools available to it
+            if self.lazy_schemas and self._fetched_schemas(current_message):
+                final_response = await self._create_completion(
+                    messages=messages, tools=tools,
+                )
+            else:
+                final_response = await self._create_completion(messages=messages)
 
             # Append final content if present
             if content := final_response.choices[0].message.content:
                 result_parts.append(content)
 
         # Return the combined response
-        return "Assistant: " + "\n".join(result_parts)
-    
-    async def _get_tools(self) -> list:
-        """Get MCP tools formatted for OpenAI."""
-        # Fetch available tools from MCP server
-        response = await self.client_session.list_tools()
+        return "Assistant: " + "\n".join(filter(None, result_parts))
 
-        # Format tools for OpenAI using list comprehension
-        # turns tools into JSON ready schema
-        return [
+    @staticmethod
+    def _fetched_schemas(message) -> bool:
+        """Return whether a message's tool calls include get_schema."""
+        return any(
+            tool_call.function.name == GET_SCHEMA_TOOL
+            for tool_call in message.tool_calls or ()
+        )
+
+    async def _create_completion(self, **kwargs):
+        """Create a chat completion under the concurrency limit."""
+        async with self._sem:
+            raw = await self.openai.chat.completions.with_raw_response.create(
+                model=MODEL,
+                max_tokens=MAX_TOKENS,
+                **kwargs,
+            )
+            # Hold the slot until the window resets if we're nearly out
+            # of requests, so queued calls don't run straight into 429s
+            # (capped, since windows can be minutes long; the SDK's retries
+            # cover any 429s after that)
+            remaining = raw.headers.get("x-ratelimit-remaining-requests", "")
+            if remaining.isdigit() and int(remaining) <= RATE_LIMIT_FLOOR:
+                wait = min(
+                    _parse_duration(raw.headers.get("x-ratelimit-reset-requests", "")),
+                    MAX_RATE_LIMIT_WAIT,
+                )
+                if wait >= 1 and self.on_rate_limit_wait is not None:
+                    self.on_rate_limit_wait(wait)
+                await asyncio.sleep(wait)
+            return raw.parse()
+
+    async def _run_tools(self, message, messages: list, result_parts: list) -> list:
+        """Execute a message's tool calls, record and return their results."""
+        # Accumulate messages for tool execution
+        messages.append(
             {
-                "type": "function",
-                "function": {
-                    "name": tool.name,
-                    "description": tool.description or "No description",
-                    "parameters": getattr(
-                        tool,
-                        "inputSchema",
-                        {"type": "object", "properties": {}},
-                    ),
-                },
+                "role": "assistant",
+                "content": message.content or "",
+                "tool_calls": message.tool_calls,
+            }
+        )
+
+        # Execute tools concurrently; gather preserves call order
+        tool_results = await asyncio.gather(
+            *(self._execute_tool(tool_call) for tool_call in message.tool_calls)
+        )
+        for tool_result in tool_results:
+            if not self.quiet:
+                result_parts.append(tool_result["log"])
+            messages.append(tool_result["message"])
+        return tool_results
+    
+    async def submit_batch(
+        self,
+        queries: list[str],
+        on_status: Callable[[str], None] | None = None,
+    ) -> list[str]:
+        """Run queries through the OpenAI Batch API and return the responses.
+
+        Batched requests are cheaper but complete asynchronously, so any tool
+        calls the model requests are reported rather than executed. Progress
+        messages (including the batch ID, needed to recover results if the
+        wait is interrupted) are passed to `on_status` if given.
+        """
+        notify = on_status or (lambda message: None)
+
+        # Build one chat completion request per query as JSONL
+        tools = await self._get_tools()
+        lines = []
+        for index, query in enumerate(queries):
+            body = {
+                "model": MODEL,
+                "max_tokens": MAX_TOKENS,
+                "messages": [{"role": "user", "content": query}],
             }
-            for tool in response.tools
+            if tools:
+                body["tools"] = tools
+            lines.append(
+                json.dumps(
+                    {
+                        "custom_id": f"query-{index}",
+                        "method": "POST",
+                        "url": "/v1/chat/completions",
+                        "body": body,
+                    }
+                )
+            )
+
+        # Upload the requests and start the batch
+        batch_file = await self.openai.files.create(
+            file=("queries.jsonl", "\n".join(lines).encode()),
+            purpose="batch",
+        )
+        batch = await self.openai.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window=BATCH_COMPLETION_WINDOW,
+        )
+        notify(f"Batch {batch.id} submitted (status: {batch.status})")
+
+        # Poll until the batch reaches a terminal state
+        try:
+            while batch.status not in ("completed", "failed", "expired", "cancelled"):
+                await asyncio.sleep(BATCH_POLL_SECONDS)
+                batch = await self.openai.batches.retrieve(batch.id)
+                notify(f"Batch {batch.id} status: {batch.status}")
+        except (asyncio.CancelledError, KeyboardInterrupt):
+            # The job keeps running on OpenAI's side; leave the user its ID
+            notify(
+                f"Stopped waiting; batch {batch.id} is still running. "
+                "Retrieve or cancel it later using this ID.",
+            )
+            raise
+        if batch.status != "completed":
+            raise RuntimeError(
+                f"Error: Batch {batch.id} ended with status '{batch.status}'",
+            )
+        if not batch.output_file_id and not batch.error_file_id:
+            raise RuntimeError(f"Error: Batch {batch.id} produced no results")
+
+        # Successes land in the output file and failed requests in the
+        # error file; either may be missing
+        records = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                content = await self.openai.files.content(file_id)
+                records.extend(json.loads(line) for line in content.text.splitlines())
+
+        # Results can arrive in any order, so match them by custom_id
+        responses = {}
+        for record in records:
+            response = record.get("response") or {}
+            if record.get("error") or response.get("status_code") != 200:
+                error = record.get("error") or response.get("body") or response
+                responses[record["custom_id"]] = f"Error: {error}"
+                continue
+            message = response["body"]["choices"][0]["message"]
+            parts = [message["content"]] if message.get("content") else []
+            for tool_call in message.get("tool_calls") or []:
+                function = tool_call["function"]
+                parts.append(
+                    f"[Requested {function['name']}({function['arguments']})]"
+                )
+            responses[record["custom_id"]] = "\n".join(parts)
+
+        return [
+            "Assistant: " + responses.get(f"query-{index}", "Error: No result")
+            for index in range(len(queries))
         ]
+
+    async def prewarm_tools(self) -> None:
+        """Populate the tool cache ahead of the first query."""
+        try:
+            await self._get_tools()
+        except Exception:
+            # The first query will retry the fetch and surface the error
+            pass
+
+    def invalidate_tools_cache(self) -> None:
+        """Drop the cached tool list so the next query refetches it."""
+        self._tools_cache = None
+        self._tools_cache_ts = 0
+
+    async def _get_tools(self) -> list:
+        """Get MCP tools formatted for OpenAI."""
+        # Serve from cache while it's still fresh
+        if (
+            self._tools_cache is not None
+            and time.monotonic() - self._tools_cache_ts < self.cache_ttl_seconds
+        ):
+            return self._tools_cache
+
+        # Share one in-flight fetch between concurrent callers (e.g. the
+        # chat prewarm and the first query) instead of starting another
+        if self._tools_fetch is None:
+            self._tools_fetch = asyncio.create_task(self._fetch_tools())
+            self._tools_fetch.add_done_callback(self._on_tools_fetched)
+        # Shield so one cancelled caller doesn't cancel it for the rest
+        return await asyncio.shield(self._tools_fetch)
+
+    def _on_tools_fetched(self, task: asyncio.Task) -> None:
+        """Clear the finished fetch so the next refresh starts a new one."""
+        if self._tools_fetch is task:
+            self._tools_fetch = None
+        # Mark a failure as retrieved even if every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    async def _fetch_tools(self) -> list:
+        """Fetch MCP tools, format them for OpenAI and refresh the cache."""
+        # Fetch available tools from MCP server, using the prefetched
+        # response the first time if there is one
+        response = None
+        if (prefetched := self._prefetched_tools) is not None:
+            self._prefetched_tools = None
+            try:
+                response = await prefetched
+            except Exception:
+                pass # fall back to a fresh fetch
+        if response is None:
+            response = await self.client_session.list_tools()
+
+        # Format tools for OpenAI in a fixed order, reusing schemas built
+        # on earlier refreshes; turns tools into JSON ready schema
+        tools = []
+        schema_cache = {}
+        self._full_schemas = {}
+        self._cacheable = set()
+        self._final_answer_tools = set(self._configured_final_tools)
+        for tool in sorted(response.tools, key=lambda t: t.name):
+            if self._is_cacheable(tool):
+                self._cacheable.add(tool.name)
+            if (getattr(tool, "meta", None) or {}).get("final_answer") is True:
+                self._final_answer_tools.add(tool.name)
+            parameters = getattr(tool, "inputSchema", None) or _EMPTY_SCHEMA
+            entry = self._schema_cache.get(tool.name)
+            if entry is None or entry[:2] != (tool.description, parameters):
+                schema = {
+                    "type": "function",
+                    "function": {
+                        "name": tool.name,
+                        "description": tool.description or "No description",
+                        "parameters": parameters,
+                    },
+                }
+                # Round-trip through sorted JSON once so nested key order
+                # is canonical and every request sends identical bytes
+                canonical = json.loads(json.dumps(schema, sort_keys=True))
+                entry = (tool.description, parameters, canonical)
+            schema_cache[tool.name] = entry
+            self._full_schemas[tool.name] = entry[2]["function"]["parameters"]
+            tools.append(entry[2])
+        self._schema_cache = schema_cache
+
+        # Phase 1 of lazy loading: swap full schemas for short summaries
+        # with permissive parameters, plus the local get_schema tool
+        if self.lazy_schemas:
+            tools = [
+                {
+                    "type": "function",
+                    "function": {
+                        "name": tool["function"]["name"],
+                        "description": tool["function"]["description"]
+                        .strip()
+                        .partition("\n")[0] or "No description",
+                        "parameters": _SUMMARY_PARAMETERS,
+                    },
+                }
+                for tool in tools
+            ]
+            tools.append(_GET_SCHEMA_SPEC)
+
+        self._tools_cache = tools
+        self._tools_cache_ts = time.monotonic()
+        return self._tools_cache
     
+    @staticmethod
+    def _is_cacheable(tool) -> bool:
+        """Return whether a tool's results may be reused across calls."""
+        # Explicit opt-in/opt-out via the tool's _meta, e.g. {"cacheable": false}
+        meta = getattr(tool, "meta", None) or {}
+        if (cacheable := meta.get("cacheable")) is not None:
+            return cacheable is True
+        # Per the MCP spec a missing readOnlyHint means the tool may modify
+        # state, so only tools that declare themselves read-only qualify
+        annotations = getattr(tool, "annotations", None)
+        if not annotations or annotations.readOnlyHint is not True:
+            return False
+        # Tools that describe themselves as non-deterministic
+        description = (tool.description or "").lower()
+        return "non-deterministic" not in description
+
+    @staticmethod
+    def _tool_result(tool_call, content: str, log: str, final: bool = False) -> dict:
+        """Build the log and tool message returned for a tool call."""
+        # once again, relying on JSON format
+        return {
+            "final": final,
+            "log": log,
+            "message": {
+                "role": "tool",
+                "tool_call_id": tool_call.id,
+                "content": content,
+            },
+        }
+
     async def _execute_tool(self, tool_call) -> dict:
         """Execute an MCP tool call and return formatted result."""
 
-        # Extract tool name and arguments
+        # Extract tool name and arguments; malformed arguments become an
+        # error result so sibling calls gathered with this one still finish
         tool_name = tool_call.function.name
-        tool_args = json.loads(tool_call.function.arguments or "{}")
+        try:
+            tool_args = _loads(tool_call.function.arguments or "{}")
+            if not isinstance(tool_args, dict):
+                raise ValueError("arguments must be a JSON object")
+        except ValueError as e:
+            content = f"Error: Invalid arguments for {tool_name}: {e}"
+            return self._tool_result(tool_call, content, f"[{content}]")
+
+        # Phase 2 of lazy loading: answer get_schema locally, never via MCP
+        if tool_name == GET_SCHEMA_TOOL:
+            requested = tool_args.get("tool_name")
+            if isinstance(requested, str) and requested in self._full_schemas:
+                content = json.dumps(self._full_schemas[requested])
+            else:
+                content = f"Error: Unknown tool '{requested}'"
+            return self._tool_result(
+                tool_call, content, f"[Fetched schema for {requested}]",
+            )
 
+        # Reuse a recent result for the same tool and arguments
+        cache_key = None
+        if tool_name in self._cacheable:
+            cache_key = (tool_name, json.dumps(tool_args, sort_keys=True))
+            cached = self._result_cache.get(cache_key)
+            if (
+                cached is not None
+                and time.monotonic() - cached["ts"] >= self.result_ttl_seconds
+            ):
+                # Expired; drop it and call the tool again
+                del self._result_cache[cache_key]
+                cached = None
+            if cached is not None:
+                self._result_cache.move_to_end(cache_key)
+                return self._tool_result(
+                    tool_call,
+                    cached["content"],
+                    cached["log"],
+                    final=tool_name in self._final_answer_tools,
+                )
+
+        final = False
         try:
             # Call the tool via MCP client session
             result = await self.client_session.call_tool(
@@ -110,7 +569,18 @@ class OpenAIQueryHandler:
             content = result.content[0].text if result.content else ""
             
             # Create log entry
-            log = f"[Used {tool_name}({tool_args})]"
+            log = f"[Used {tool_name}({_dumps(tool_args)})]"
+            final = tool_name in self._final_answer_tools and not result.isError
+
+            # Remember successful results, evicting the least recently used
+            if cache_key is not None and not result.isError:
+                self._result_cache[cache_key] = {
+                    "log": log,
+                    "content": content,
+                    "ts": time.monotonic(),
+                }
+                if len(self._result_cache) > RESULT_CACHE_SIZE:
+                    self._result_cache.popitem(last=False)
 
         # Handle any exceptions during tool execution
         except Exception as e:
@@ -118,12 +588,4 @@ class OpenAIQueryHandler:
             log = f"[{content}]"
 
         # Return log and message structure
-        # once again, relying on JSON format
-        return {
-            "log": log,
-            "message": {
-                "role": "tool",
-                "tool_call_id": tool_call.id,
-                "content": content,
-            },
-        }
\ No newline at end of file
+        return self._tool_result(tool_call, content, log, final=final)
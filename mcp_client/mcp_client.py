@@ -1,10 +1,13 @@
+import asyncio
+import os
 import sys
 from contextlib import AsyncExitStack
-from typing import Any, Awaitable, Callable, ClassVar
+from typing import Any, Awaitable, Callable
 from pathlib import Path
 
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
+from openai import OpenAIError
 
 from mcp_client import chat
 from mcp_client.handlers import OpenAIQueryHandler
@@ -17,24 +20,32 @@ class MCPClient:
             # Call client methods here...
     """
 
-    client_session: ClassVar[ClientSession]
+    client_session: ClientSession
 
     def __init__(self, server_path: str):
         ''' Initialize MCPClient with the server path.
             Also, sets up an AsyncExitStack for resource management.'''
         self.server_path = server_path
         self.exit_stack = AsyncExitStack()
+        self._prewarm: asyncio.Task | None = None
 
     async def __aenter__(self) -> "MCPClient":
-        ''' Save the class type and establish a connection to the MCP server.
-            Store the client session in a class variable for shared access.'''
-        cls = type(self)
-        cls.client_session = await self._connect_to_server()
+        ''' Establish a connection to the MCP server and store the
+            client session on this instance.'''
+        self.client_session = await self._connect_to_server()
+        # Start fetching the tool list now to hide it behind startup
+        self._prewarm = asyncio.create_task(self.client_session.list_tools())
         return self
 
     async def __aexit__(self, *_) -> None:
         ''' Method that will be called once the context is exited.
             Closes the exit stack to clean up resources.'''
+        if self._prewarm is not None:
+            if not self._prewarm.done():
+                self._prewarm.cancel()
+            elif not self._prewarm.cancelled():
+                # Mark any failure as retrieved so asyncio doesn't log it
+                self._prewarm.exception()
         await self.exit_stack.aclose()
 
     async def _connect_to_server(self) -> ClientSession:
@@ -43,18 +54,23 @@ class MCPClient:
         On Windows we invoke the Python interpreter directly.
         Returns an initialized ClientSession or raises RuntimeError with details.
         '''
-        server_path = Path(self.server_path).resolve()
-        if not server_path.exists():
-            raise RuntimeError(f"Server script not found: {server_path}")
+        # abspath is pure string handling; a single stat checks existence
+        server_path = os.path.abspath(self.server_path)
+        try:
+            os.stat(server_path)
+        except OSError as e:
+            raise RuntimeError(
+                f"Server script not accessible: {server_path} ({e.strerror})"
+            ) from e
 
         # Build platform-appropriate command.
         if sys.platform == "win32":
             command = sys.executable # Use Python executable directly on Windows
-            args = [str(server_path)] # Pass server script as argument
+            args = [server_path] # Pass server script as argument
         else:
             # On POSIX we can still just exec Python directly; avoids shell.
             command = sys.executable
-            args = [str(server_path)]
+            args = [server_path]
 
         try:
             # Establish stdio client connection.
@@ -79,48 +95,116 @@ class MCPClient:
 
     async def list_all_members(self) -> None:
         """List all available tools, prompts, and resources."""
-        print("MCP Server Members")
-        print("=" * 50)
-
         # Define sections to list
         sections = {
-            "tools": self.client_session.list_tools,
+            "tools": self._list_tools,
             "prompts": self.client_session.list_prompts,
             "resources": self.client_session.list_resources,
         }
-        # Iterate and list each section
-        for section, listing_method in sections.items():
-            await self._list_section(section, listing_method)
-
-        print("\n" + "=" * 50)
-
-    async def _list_section(self, section: str, list_method: Callable[[], Awaitable[Any]]) -> None:
+        # Fetch all sections concurrently; gather keeps the original order
+        blocks = await asyncio.gather(
+            *(
+                self._list_section(section, listing_method)
+                for section, listing_method in sections.items()
+            )
+        )
+
+        # Assemble the full listing and write it out in one call
+        sys.stdout.write(
+            "MCP Server Members\n"
+            + "=" * 50 + "\n"
+            + "".join(block + "\n" for block in blocks)
+            + "\n" + "=" * 50 + "\n"
+        )
+
+    async def _list_tools(self) -> Any:
+        '''Return the tool list prefetched in __aenter__, falling back to
+            a fresh request if the prefetch failed.'''
+        if (prewarm := self._prewarm) is not None:
+            self._prewarm = None
+            try:
+                return await prewarm
+            except Exception:
+                pass # fall back to a fresh fetch
+        return await self.client_session.list_tools()
+
+    async def _list_section(self, section: str, list_method: Callable[[], Awaitable[Any]]) -> str:
         '''Take a section name and list_method object and dynamically call the 
             method and retrieve the members or items in the section. 
-            Then, print the section title, the number of items, and the 
+            Then, return the section title, the number of items, and the 
             details for each one, including its name and description.'''
         try:
             items = getattr(await list_method(), section)
             if items:
-                print(f"\n{section.upper()} ({len(items)}):")
-                print("-" * 30)
-                # Print each item's name and description
+                lines = [f"\n{section.upper()} ({len(items)}):", "-" * 30]
+                # Add each item's name and description
                 for item in items:
                     description = item.description or "No description"
-                    print(f" > {item.name} - {description}")
-            else:
-                # No items found in this section
-                print(f"\n{section.upper()}: None available")
+                    lines.append(f" > {item.name} - {description}")
+                return "\n".join(lines)
+            # No items found in this section
+            return f"\n{section.upper()}: None available"
         except Exception as e: # handle errors gracefully
-            print(f"\n{section.upper()}: Error - {e}")
+            return f"\n{section.upper()}: Error - {e}"
 
-    async def run_chat(self) -> None:
+    async def run_chat(self, lazy_schemas: bool = False, quiet: bool = False) -> None:
         """Start interactive chat with MCP server using OpenAI."""
        
         try:
-            handler = OpenAIQueryHandler(self.client_session)
+            handler = OpenAIQueryHandler(
+                self.client_session,
+                lazy_schemas=lazy_schemas,
+                prefetched_tools=self._prewarm,
+                quiet=quiet,
+                on_rate_limit_wait=chat.print_rate_limit_wait,
+            )
+            # Clear the handler's tool cache when the client exits
+            self.exit_stack.callback(handler.invalidate_tools_cache)
+            # Close the handler's pooled HTTP connections on exit
+            self.exit_stack.push_async_callback(handler.aclose)
             await chat.run_chat(handler)
 
         # Handle connection errors gracefully
         except RuntimeError as e:
-            print(e)
\ No newline at end of file
+            print(e)
+
+    async def run_batch(self, queries_path: Path) -> None:
+        """Submit queries from a file as an OpenAI batch and print results."""
+
+        try:
+            # One query per non-empty line
+            queries = [
+                line.strip()
+                for line in queries_path.read_text(encoding="utf-8").splitlines()
+                if line.strip()
+            ]
+        except OSError as e:
+            print(f"Error: Could not read queries file '{queries_path}': {e}")
+            return
+        if not queries:
+            print(f"Error: No queries found in '{queries_path}'")
+            return
+
+        try:
+            handler = OpenAIQueryHandler(
+                self.client_session,
+                prefetched_tools=self._prewarm,
+            )
+            # Close the handler's pooled HTTP connections on exit
+            self.exit_stack.push_async_callback(handler.aclose)
+            print(
+                f"Submitting {len(queries)} queries as a batch; results "
+                "may take up to 24h..."
+            )
+            responses = await handler.submit_batch(queries, on_status=print)
+
+        # Handle API key and batch errors gracefully
+        except RuntimeError as e:
+            print(e)
+            return
+        except OpenAIError as e:
+            print(f"Error: Batch request failed: {e}")
+            return
+
+        for query, response in zip(queries, responses):
+            print(f"\nYou: {query}\n{response}")
\ No newline at end of file